@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import os
 import json
+from io import StringIO
 from datetime import datetime
 import hashlib
 import sqlite3  # Added SQLite import
@@ -202,8 +203,13 @@ if 'username' not in st.session_state:
     st.session_state.username = None
 if 'attendance_uploaded' not in st.session_state:
     st.session_state.attendance_uploaded = False
-if 'attendance_data' not in st.session_state:
-    st.session_state.attendance_data = None
+if 'roster_version' not in st.session_state:
+    st.session_state.roster_version = None
+if 'roster_error' not in st.session_state:
+    st.session_state.roster_error = None
+
+# Rosters are shared read-only between sessions; this bounds how many stay in memory
+ROSTER_CACHE_SIZE = 64
 
 # Database setup
 def init_db():
@@ -248,6 +254,48 @@ def init_db():
     PRIMARY KEY (username, type, batch))
     ''')
     
+    # Create roster versions table, one row per student per upload
+    # (roll has no declared type so it keeps the type it had in the Excel file)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS roster_versions
+    (username TEXT, version INTEGER, roll, name TEXT, batch TEXT, 
+    PRIMARY KEY (username, version, roll))
+    ''')
+    
+    # Create append-only change log, one row per student per recorded session
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS attendance_changes
+    (seq INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT, date TEXT, type TEXT, 
+    batch TEXT, roll, status TEXT)
+    ''')
+    
+    # Create per-student attendance index; the primary key serves lookups by roll
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS student_attendance
+    (username TEXT, roll, type TEXT, date TEXT, batch TEXT, status TEXT, 
+    PRIMARY KEY (username, roll, type, date))
+    ''')
+    
+    # Create archive for students dropped from the roster, keyed by the version that dropped them
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS archived_students
+    (username TEXT, version INTEGER, type TEXT, data TEXT, 
+    PRIMARY KEY (username, version, type))
+    ''')
+    
+    # Create archive for removed students' index rows, so a reused roll starts with a clean history
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS archived_student_attendance
+    (username TEXT, version INTEGER, roll, type TEXT, date TEXT, batch TEXT, status TEXT, 
+    PRIMARY KEY (username, version, roll, type, date))
+    ''')
+    
+    # Create record of faculty whose earlier sessions have been backfilled into the index
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS student_index_backfills
+    (username TEXT PRIMARY KEY)
+    ''')
+    
     conn.commit()
     conn.close()
 
@@ -282,8 +330,10 @@ def verify_user(username, password):
         return True
     return False
 
-def save_attendance_data(username, df):
-    conn = sqlite3.connect('attendance_tracker.db')
+def save_attendance_data(username, df, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
     c = conn.cursor()
     # Convert DataFrame to JSON string
     data_json = df.to_json()
@@ -292,8 +342,9 @@ def save_attendance_data(username, df):
     c.execute("INSERT OR REPLACE INTO student_data (username, data) VALUES (?, ?)", 
               (username, data_json))
     
-    conn.commit()
-    conn.close()
+    if own_conn:
+        conn.commit()
+        conn.close()
 
 def load_attendance_data(username):
     try:
@@ -305,22 +356,25 @@ def load_attendance_data(username):
         
         if result:
             # Convert JSON string back to DataFrame
-            return pd.read_json(result[0])
+            return pd.read_json(StringIO(result[0]))
         return None
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
 
-def save_class_attendance(username, df):
-    conn = sqlite3.connect('attendance_tracker.db')
+def save_class_attendance(username, df, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
     c = conn.cursor()
     data_json = df.to_json()
     
     c.execute("INSERT OR REPLACE INTO class_attendance (username, data) VALUES (?, ?)", 
               (username, data_json))
     
-    conn.commit()
-    conn.close()
+    if own_conn:
+        conn.commit()
+        conn.close()
 
 def load_class_attendance(username):
     try:
@@ -331,22 +385,25 @@ def load_class_attendance(username):
         conn.close()
         
         if result:
-            return pd.read_json(result[0])
+            return pd.read_json(StringIO(result[0]))
         return None
     except Exception as e:
         st.error(f"Error loading class attendance: {e}")
         return None
 
-def save_practical_attendance(username, df):
-    conn = sqlite3.connect('attendance_tracker.db')
+def save_practical_attendance(username, df, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
     c = conn.cursor()
     data_json = df.to_json()
     
     c.execute("INSERT OR REPLACE INTO practical_attendance (username, data) VALUES (?, ?)", 
               (username, data_json))
     
-    conn.commit()
-    conn.close()
+    if own_conn:
+        conn.commit()
+        conn.close()
 
 def load_practical_attendance(username):
     try:
@@ -357,22 +414,25 @@ def load_practical_attendance(username):
         conn.close()
         
         if result:
-            return pd.read_json(result[0])
+            return pd.read_json(StringIO(result[0]))
         return None
     except Exception as e:
         st.error(f"Error loading practical attendance: {e}")
         return None
 
-def save_batch_attendance(username, batch, df):
-    conn = sqlite3.connect('attendance_tracker.db')
+def save_batch_attendance(username, batch, df, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
     c = conn.cursor()
     data_json = df.to_json()
     
     c.execute("INSERT OR REPLACE INTO batch_attendance (username, batch, data) VALUES (?, ?, ?)", 
               (username, batch, data_json))
     
-    conn.commit()
-    conn.close()
+    if own_conn:
+        conn.commit()
+        conn.close()
 
 def load_batch_attendance(username, batch):
     try:
@@ -383,7 +443,7 @@ def load_batch_attendance(username, batch):
         conn.close()
         
         if result:
-            return pd.read_json(result[0])
+            return pd.read_json(StringIO(result[0]))
         return None
     except Exception as e:
         st.error(f"Error loading batch attendance: {e}")
@@ -400,6 +460,300 @@ def save_defaulters(username, type_name, batch, df):
     conn.commit()
     conn.close()
 
+def record_attendance_changes(username, date_str, type_name, records, conn=None):
+    # records is an iterable of (batch, roll, status) for the students in the session
+    rows = [(username, date_str, type_name, batch, roll, status) for batch, roll, status in records]
+    
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
+    c = conn.cursor()
+    c.executemany("INSERT INTO attendance_changes (username, date, type, batch, roll, status) VALUES (?, ?, ?, ?, ?, ?)", 
+                  rows)
+    # Keep the per-student index in step; re-recording a session overwrites it
+    c.executemany("INSERT OR REPLACE INTO student_attendance (username, roll, type, date, batch, status) VALUES (?, ?, ?, ?, ?, ?)", 
+                  [(username, roll, type_name, date_str, batch, status) for _, _, _, batch, roll, status in rows])
+    
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+def save_archived_students(username, version, type_name, df, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
+    c = conn.cursor()
+    data_json = df.to_json()
+    
+    c.execute("INSERT OR REPLACE INTO archived_students (username, version, type, data) VALUES (?, ?, ?, ?)", 
+              (username, version, type_name, data_json))
+    
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+def archive_student_attendance(username, version, rolls, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
+    c = conn.cursor()
+    params = [(username, roll) for roll in rolls]
+    c.executemany("INSERT OR REPLACE INTO archived_student_attendance (username, version, roll, type, date, batch, status) "
+                  f"SELECT username, {int(version)}, roll, type, date, batch, status FROM student_attendance "
+                  "WHERE username=? AND roll=?", 
+                  params)
+    c.executemany("DELETE FROM student_attendance WHERE username=? AND roll=?", params)
+    
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+def build_student_index(username, conn=None):
+    # Backfill the index once per faculty from the stored frames. Frames are read on this
+    # connection and errors propagate, so a failed backfill is never marked as done.
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM student_index_backfills WHERE username=?", (username,))
+    if c.fetchone() is None:
+        rows = []
+        for type_name, table in [("Class", "class_attendance"), ("Practical", "practical_attendance")]:
+            c.execute(f"SELECT data FROM {table} WHERE username=?", (username,))
+            result = c.fetchone()
+            if not result:
+                continue
+            frame = pd.read_json(StringIO(result[0]))
+            records = frame.melt(id_vars=['roll', 'name'], var_name='session', value_name='status')
+            records = records[records['status'].isin(["Present", "Absent"])
+                              & records['session'].str.endswith(f"_{type_name}")]
+            for roll, session, status in records[['roll', 'session', 'status']].astype(object).itertuples(index=False):
+                rows.append((username, roll, type_name, session.rsplit("_", 1)[0], get_batch(roll), status))
+        
+        # The stored frames are what the downloads show, so they win over existing index rows
+        c.executemany("INSERT OR REPLACE INTO student_attendance (username, roll, type, date, batch, status) VALUES (?, ?, ?, ?, ?, ?)", 
+                      rows)
+        c.execute("INSERT INTO student_index_backfills (username) VALUES (?)", (username,))
+    
+    if own_conn:
+        conn.commit()
+        conn.close()
+
+def ensure_student_index(username):
+    # The lookup index is secondary, so a failed backfill must not block login or recording
+    try:
+        build_student_index(username)
+    except Exception as e:
+        st.warning(f"Could not index earlier attendance for student lookup: {e}")
+
+def normalize_name(name):
+    return " ".join(str(name).split()).casefold()
+
+def lookup_student_attendance(username, roll, name):
+    # Read-only connection; the (username, roll) key prefix means only this student's rows are read
+    conn = sqlite3.connect('file:attendance_tracker.db?mode=ro', uri=True)
+    c = conn.cursor()
+    # Pin the latest version first so the name lookup uses the full (username, version, roll) key
+    c.execute("SELECT name FROM roster_versions WHERE username=? AND roll=? "
+              "AND version=(SELECT MAX(version) FROM roster_versions WHERE username=?)", 
+              (username, roll, username))
+    result = c.fetchone()
+    
+    # The student must give the name on the current roster, so rolls cannot simply be enumerated
+    if not result or result[0] is None or normalize_name(result[0]) != normalize_name(name):
+        conn.close()
+        return None
+    
+    c.execute("SELECT type, date, status FROM student_attendance WHERE username=? AND roll=? ORDER BY type, date", 
+              (username, roll))
+    records = c.fetchall()
+    conn.close()
+    
+    if not records:
+        return None
+    
+    summary = {}
+    for type_name in ["Class", "Practical"]:
+        sessions = [(date, status) for t, date, status in records if t == type_name]
+        missed = [date for date, status in sessions if status == "Absent"]
+        attended = len(sessions) - len(missed)
+        summary[type_name] = {
+            "total": len(sessions),
+            "attended": attended,
+            "percentage": attended / len(sessions) * 100 if sessions else None,
+            "missed": missed,
+        }
+    return summary
+
+def get_roster_version(username, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
+    c = conn.cursor()
+    c.execute("SELECT MAX(version) FROM roster_versions WHERE username=?", (username,))
+    result = c.fetchone()
+    if own_conn:
+        conn.close()
+    return result[0] if result else None
+
+def save_roster_version(username, df, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('attendance_tracker.db')
+    c = conn.cursor()
+    version = (get_roster_version(username, conn) or 0) + 1
+    rows = [(username, version, roll, name, batch)
+            for roll, name, batch in df[['roll', 'name', 'batch']].astype(object).itertuples(index=False)]
+    c.executemany("INSERT INTO roster_versions (username, version, roll, name, batch) VALUES (?, ?, ?, ?, ?)", 
+                  rows)
+    
+    if own_conn:
+        conn.commit()
+        conn.close()
+    return version
+
+def load_roster(username, version):
+    try:
+        conn = sqlite3.connect('attendance_tracker.db')
+        df = pd.read_sql_query(
+            "SELECT roll, name, batch FROM roster_versions WHERE username=? AND version=? ORDER BY rowid",
+            conn, params=(username, version))
+        conn.close()
+        
+        if df.empty:
+            return None
+        return df
+    except Exception as e:
+        st.error(f"Error loading roster: {e}")
+        return None
+
+@st.cache_resource(max_entries=ROSTER_CACHE_SIZE, show_spinner=False)
+def get_cached_roster(username, version):
+    # A roster version is immutable, so one copy can back every session that uses it.
+    # Callers must treat the returned DataFrame as read-only.
+    df = load_roster(username, version)
+    if df is None:
+        # Raising keeps the failure out of the cache, so the next rerun tries again
+        raise LookupError(f"Roster version {version} could not be loaded")
+    return df
+
+def current_roster_version(username):
+    # Errors are kept in session state because login reruns straight to the upload page
+    try:
+        version = get_roster_version(username)
+        if version is None:
+            # Migrate rosters uploaded before versioning into the keyed table
+            legacy_df = load_attendance_data(username)
+            if legacy_df is not None:
+                duplicates = legacy_df.loc[legacy_df['roll'].duplicated(), 'roll'].unique().tolist()
+                if duplicates:
+                    st.session_state.roster_error = (
+                        f"Your saved roster has duplicate roll numbers ({', '.join(map(str, duplicates))}). "
+                        "Please upload a corrected class Excel.")
+                    return None
+                if 'batch' not in legacy_df.columns:
+                    legacy_df['batch'] = legacy_df['roll'].apply(get_batch)
+                version = save_roster_version(username, legacy_df)
+        return version
+    except Exception as e:
+        st.session_state.roster_error = f"Error loading roster: {e}"
+        return None
+
+def diff_roster(old_df, new_df):
+    # Hash join on roll: one dict per roster, so the diff is linear in roster size
+    old_names = dict(zip(old_df['roll'], old_df['name']))
+    new_names = dict(zip(new_df['roll'], new_df['name']))
+    
+    added = [roll for roll in new_names if roll not in old_names]
+    removed = [roll for roll in old_names if roll not in new_names]
+    renamed = {roll: name for roll, name in new_names.items()
+               if roll in old_names and old_names[roll] != name}
+    return added, removed, renamed
+
+def apply_roster_diff(attendance_df, roster_df, added, removed, renamed):
+    # Rows are matched by roll, never by position, so the frame order does not matter
+    attendance_df = attendance_df[~attendance_df['roll'].isin(removed)].copy()
+    
+    if renamed:
+        mask = attendance_df['roll'].isin(list(renamed))
+        attendance_df.loc[mask, 'name'] = attendance_df.loc[mask, 'roll'].map(renamed)
+    
+    if added:
+        new_rows = roster_df.loc[roster_df['roll'].isin(added), ['roll', 'name']]
+        attendance_df = pd.concat([attendance_df, new_rows], ignore_index=True)
+        # New students have no record for sessions held before they joined
+        session_cols = [col for col in attendance_df.columns if col not in ['roll', 'name']]
+        attendance_df[session_cols] = attendance_df[session_cols].fillna("")
+    
+    return attendance_df.reset_index(drop=True)
+
+def save_batch_tables(username, practical_df, roster_df, batches=("A", "B", "C", "D"), conn=None):
+    batch_of = practical_df['roll'].map(dict(zip(roster_df['roll'], roster_df['batch'])))
+    for batch in batches:
+        save_batch_attendance(username, batch, practical_df[batch_of == batch], conn)
+
+def load_previous_roster(username):
+    version = get_roster_version(username)
+    if version is not None:
+        try:
+            return get_cached_roster(username, version)
+        except LookupError:
+            pass
+    # Rosters uploaded before versioning only live in student_data, which also
+    # mirrors the latest version if that version cannot be read
+    return load_attendance_data(username)
+
+def apply_roster_upload(username, df):
+    old_df = load_previous_roster(username)
+    
+    if old_df is not None:
+        added, removed, renamed = diff_roster(old_df, df)
+    else:
+        added, removed, renamed = [], [], {}
+    changed = bool(added or removed or renamed)
+    
+    # Read everything first, then apply all writes in one transaction so a failed
+    # upload leaves the previous roster version and its attendance untouched
+    class_df = load_class_attendance(username) if changed else None
+    practical_df = load_practical_attendance(username) if changed else None
+    
+    conn = sqlite3.connect('attendance_tracker.db')
+    try:
+        with conn:
+            # Bring the lookup index up to date first, so archiving removed rolls below
+            # leaves every store (frames, index, archives) in step
+            build_student_index(username, conn)
+            version = save_roster_version(username, df, conn)
+            save_attendance_data(username, df, conn)
+            
+            # Removed students' rows are archived rather than deleted, and their index rows
+            # are moved out so a roll given to a new student does not inherit the old history
+            if removed:
+                archive_student_attendance(username, version, removed, conn)
+            
+            if class_df is not None:
+                if removed:
+                    save_archived_students(username, version, "Class", class_df[class_df['roll'].isin(removed)], conn)
+                save_class_attendance(username, apply_roster_diff(class_df, df, added, removed, renamed), conn)
+            
+            if practical_df is not None:
+                if removed:
+                    save_archived_students(username, version, "Practical",
+                                           practical_df[practical_df['roll'].isin(removed)], conn)
+                practical_df = apply_roster_diff(practical_df, df, added, removed, renamed)
+                save_practical_attendance(username, practical_df, conn)
+                
+                # Only rewrite the batches whose membership or names changed
+                old_batch_of = dict(zip(old_df['roll'], old_df['roll'].apply(get_batch)))
+                new_batch_of = dict(zip(df['roll'], df['batch']))
+                affected = {new_batch_of[roll] for roll in added + list(renamed)}
+                affected |= {old_batch_of[roll] for roll in removed}
+                save_batch_tables(username, practical_df, df, sorted(b for b in affected if b), conn)
+    finally:
+        conn.close()
+    
+    return version, added, removed, renamed
+
 def get_batch(roll):
     try:
         roll = int(roll)
@@ -417,7 +771,8 @@ def get_batch(roll):
 def logout():
     st.session_state.logged_in = False
     st.session_state.username = None
-    st.session_state.attendance_data = None
+    st.session_state.roster_version = None
+    st.session_state.roster_error = None
     st.session_state.attendance_uploaded = False
     st.rerun()
 
@@ -427,7 +782,7 @@ def login():
     
     st.markdown("<div class='info-box'>Welcome to the Attendance Tracker System. Please login to continue or register for a new account.</div>", unsafe_allow_html=True)
     
-    tab1, tab2 = st.tabs(["🔑 Login", "✏ Register"])
+    tab1, tab2, tab3 = st.tabs(["🔑 Login", "✏ Register", "🎓 Student Lookup"])
     
     with tab1:
         st.markdown("<div class='section'>", unsafe_allow_html=True)
@@ -443,10 +798,11 @@ def login():
                 st.success("Login successful!... Redirecting...")
                 st.session_state.logged_in = True
                 st.session_state.username = username
-                attendance_data = load_attendance_data(username)
-                if attendance_data is not None:
-                    st.session_state.attendance_data = attendance_data
+                roster_version = current_roster_version(username)
+                if roster_version is not None:
+                    st.session_state.roster_version = roster_version
                     st.session_state.attendance_uploaded = True
+                ensure_student_index(username)
                 st.rerun()
             else:
                 st.error("Invalid username or password")
@@ -471,6 +827,50 @@ def login():
                     st.success("Registration successful! You can now login.")
                 else:
                     st.error("Username already exists")
+    
+    with tab3:
+        student_lookup()
+
+# Student Lookup (read-only, no login required)
+def student_lookup():
+    st.markdown("<div class='section'>", unsafe_allow_html=True)
+    faculty = st.text_input("👤 Faculty Username", key="lookup_faculty")
+    roll_input = st.text_input("🔢 Roll Number", key="lookup_roll")
+    name_input = st.text_input("🎓 Your Name (as on the class list)", key="lookup_name")
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col2:
+        lookup_button = st.button("Look Up", key="lookup_btn", use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+    
+    if lookup_button:
+        if not faculty or not roll_input.strip() or not name_input.strip():
+            st.error("Faculty username, roll number and name cannot be empty")
+            return
+        
+        try:
+            roll = int(roll_input.strip())
+        except ValueError:
+            roll = roll_input.strip()
+        
+        summary = lookup_student_attendance(faculty, roll, name_input)
+        if summary is None:
+            # Same message whether the roll, the name or the records are missing
+            st.info("No matching attendance records found. Check the faculty username, roll number and name.")
+            return
+        
+        col1, col2 = st.columns(2)
+        for col, type_name in [(col1, "Class"), (col2, "Practical")]:
+            stats = summary[type_name]
+            with col:
+                if not stats["total"]:
+                    st.info(f"No {type_name.lower()} sessions recorded yet.")
+                    continue
+                st.metric(f"{type_name} Attendance", f"{stats['percentage']:.1f}%",
+                          f"{stats['attended']} of {stats['total']} sessions", delta_color="off")
+                if stats["missed"]:
+                    st.markdown(f"<p style='background-color: #3A2518; padding: 8px; border-radius: 5px; color: #F87171;'>Missed: {', '.join(stats['missed'])}</p>", unsafe_allow_html=True)
+                else:
+                    st.markdown("<p style='background-color: #0D3331; padding: 8px; border-radius: 5px; color: #34D399;'>No sessions missed.</p>", unsafe_allow_html=True)
 
 # Upload Excel Page (Only First Time)
 def upload_excel_page():
@@ -479,6 +879,10 @@ def upload_excel_page():
     
     st.markdown("<div class='section'>", unsafe_allow_html=True)
     st.markdown("<h2 class='sub-header'>Upload Class Excel</h2>", unsafe_allow_html=True)
+    
+    if st.session_state.roster_error:
+        st.error(st.session_state.roster_error)
+        st.session_state.roster_error = None
     st.markdown("<p>Please upload your class excel file with student details. The file must contain <b>'roll'</b> and <b>'name'</b> columns.</p>", unsafe_allow_html=True)
     
     uploaded_file = st.file_uploader("Upload Class Excel File", type=["xlsx", "xls"], key="excel_upload")
@@ -489,6 +893,10 @@ def upload_excel_page():
             if 'roll' not in df.columns or 'name' not in df.columns:
                 st.error("Excel must include 'roll' and 'name' columns.")
                 return
+            if df['roll'].duplicated().any():
+                duplicates = df.loc[df['roll'].duplicated(), 'roll'].unique().tolist()
+                st.error(f"Roll numbers must be unique. Duplicates: {', '.join(map(str, duplicates))}")
+                return
             
             # Show preview of the data
             st.markdown("<p style='margin-top: 20px; font-weight: 500; color: #64FFDA;'>Data Preview:</p>", unsafe_allow_html=True)
@@ -496,13 +904,22 @@ def upload_excel_page():
             
             df['batch'] = df['roll'].apply(get_batch)
             
+            # Show what the upload will change before anything is written
+            old_df = load_previous_roster(st.session_state.username)
+            if old_df is not None:
+                added, removed, renamed = diff_roster(old_df, df)
+                st.markdown(f"<div class='info-box'>Changes from the current roster: <b>{len(added)}</b> added, <b>{len(removed)}</b> removed, <b>{len(renamed)}</b> renamed.</div>", unsafe_allow_html=True)
+                if removed:
+                    st.markdown(f"<div class='warning-box'>⚠ These students are not in the new file. They will be removed from attendance and their records archived: {', '.join(map(str, removed))}</div>", unsafe_allow_html=True)
+            
             col1, col2, col3 = st.columns([1, 1, 1])
             with col2:
                 if st.button("Confirm Upload", key="confirm_upload", use_container_width=True):
-                    st.session_state.attendance_data = df
+                    version, added, removed, renamed = apply_roster_upload(st.session_state.username, df)
+                    st.session_state.roster_version = version
                     st.session_state.attendance_uploaded = True
-                    save_attendance_data(st.session_state.username, df)
-                    st.success("Excel uploaded successfully! Redirecting...")
+                    st.success(f"Excel uploaded successfully as roster version {version} "
+                               f"({len(added)} added, {len(removed)} removed, {len(renamed)} renamed). Redirecting...")
                     st.rerun()
         except Exception as e:
             st.error(f"Error: {str(e)}")
@@ -531,7 +948,12 @@ def main_app():
     # Main content
     st.markdown("<h1 class='main-header'>📊 Attendance Tracker</h1>", unsafe_allow_html=True)
     
-    df = st.session_state.attendance_data
+    # Shared, read-only roster; the session only keeps the version handle
+    try:
+        df = get_cached_roster(st.session_state.username, st.session_state.roster_version)
+    except LookupError as e:
+        st.error(f"{e}. Please upload the class Excel again.")
+        return
     
     tabs = st.tabs(["📝 Take Attendance", "📊 View Reports", "⚠ Defaulter List"])
     
@@ -566,33 +988,62 @@ def main_app():
                     absent_list.append(str(r))
             
             column_name = f"{date_str}_{attendance_type}"
-            updated_df = df.copy()
+            ensure_student_index(st.session_state.username)
+            batch_of = dict(zip(df['roll'], df['batch']))
             
             if attendance_type == "Class":
                 class_df = load_class_attendance(st.session_state.username)
                 if class_df is None:
-                    class_df = updated_df[['roll', 'name']].copy()
+                    class_df = df[['roll', 'name']].copy()
                 
+                previous = class_df[column_name].copy() if column_name in class_df.columns else None
                 class_df[column_name] = "Present"
                 class_df.loc[class_df['roll'].isin(absent_list), column_name] = "Absent"
-                save_class_attendance(st.session_state.username, class_df)
-                st.success("Class attendance recorded successfully!")
+                # Re-recording a session only emits the rolls whose status actually changed
+                changed = class_df[column_name] != previous if previous is not None else class_df[column_name] != ""
+                
+                # The frame and its change-log rows are committed together or not at all
+                conn = sqlite3.connect('attendance_tracker.db')
+                try:
+                    with conn:
+                        save_class_attendance(st.session_state.username, class_df, conn)
+                        record_attendance_changes(st.session_state.username, date_str, "Class", zip(
+                            class_df.loc[changed, 'roll'].map(batch_of), class_df.loc[changed, 'roll'].astype(object),
+                            class_df.loc[changed, column_name]), conn)
+                    st.success("Class attendance recorded successfully!")
+                except sqlite3.Error as e:
+                    st.error(f"Error recording class attendance: {e}")
+                finally:
+                    conn.close()
             
             elif attendance_type == "Practical" and selected_batch:
                 practical_df = load_practical_attendance(st.session_state.username)
                 if practical_df is None:
-                    practical_df = updated_df[['roll', 'name']].copy()
+                    practical_df = df[['roll', 'name']].copy()
                 
-                practical_df[column_name] = ""
-                practical_df.loc[updated_df['batch'] == selected_batch, column_name] = "Present"
-                practical_df.loc[(updated_df['batch'] == selected_batch) & (practical_df['roll'].isin(absent_list)), column_name] = "Absent"
-                save_practical_attendance(st.session_state.username, practical_df)
+                # Look up each row's batch by roll so the mask lines up with practical_df
+                in_batch = practical_df['roll'].map(batch_of) == selected_batch
+                # Several batches can have a practical on the same date; only this batch's cells change
+                previous = practical_df[column_name].copy() if column_name in practical_df.columns else None
+                if previous is None:
+                    practical_df[column_name] = ""
+                practical_df.loc[in_batch, column_name] = "Present"
+                practical_df.loc[in_batch & (practical_df['roll'].isin(absent_list)), column_name] = "Absent"
+                changed = in_batch & (practical_df[column_name] != previous) if previous is not None else in_batch
                 
-                for batch in ['A', 'B', 'C', 'D']:
-                    batch_df = practical_df[practical_df['roll'].isin(updated_df[updated_df['batch'] == batch]['roll'])]
-                    save_batch_attendance(st.session_state.username, batch, batch_df)
-                
-                st.success(f"Practical attendance for Batch {selected_batch} recorded successfully!")
+                conn = sqlite3.connect('attendance_tracker.db')
+                try:
+                    with conn:
+                        save_practical_attendance(st.session_state.username, practical_df, conn)
+                        record_attendance_changes(st.session_state.username, date_str, "Practical", zip(
+                            [selected_batch] * int(changed.sum()), practical_df.loc[changed, 'roll'].astype(object),
+                            practical_df.loc[changed, column_name]), conn)
+                        save_batch_tables(st.session_state.username, practical_df, df, conn=conn)
+                    st.success(f"Practical attendance for Batch {selected_batch} recorded successfully!")
+                except sqlite3.Error as e:
+                    st.error(f"Error recording practical attendance: {e}")
+                finally:
+                    conn.close()
         st.markdown("</div>", unsafe_allow_html=True)
         
         st.markdown("<div class='section'>", unsafe_allow_html=True)
@@ -714,10 +1165,12 @@ def main_app():
                     st.warning(f"No attendance records found in {type_name}.")
                     return
                 
-                total_classes = df.shape[1] - 2  # excluding roll and name columns
-                # Change map() to applymap() - this is a key fix
-                attendance_counts = df.iloc[:, 2:].applymap(lambda x: 1 if x == "Present" else 0)
-                df["Attendance %"] = attendance_counts.sum(axis=1) / total_classes * 100
+                sessions = df.iloc[:, 2:]  # excluding roll and name columns
+                # Empty cells are sessions a student was not part of (other batches, or held
+                # before they joined), so they count toward neither attended nor total
+                total_classes = sessions.isin(["Present", "Absent"]).sum(axis=1)
+                attended = (sessions == "Present").sum(axis=1)
+                df["Attendance %"] = attended / total_classes.where(total_classes > 0) * 100
             
                 defaulters_df = df[df["Attendance %"] < 80].copy()
                 if defaulters_df.empty:
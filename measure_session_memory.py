@@ -0,0 +1,130 @@
+"""Measure per-session memory of the attendance app.
+
+Simulates many concurrent logged-in sessions with streamlit's AppTest against
+a scratch database holding several faculty rosters, and reports how much the
+traced Python heap (tracemalloc) and the process RSS grow per session, along
+with the size of what each session keeps in st.session_state.
+
+Usage:
+    python measure_session_memory.py [--sessions N] [--faculty F] [--roster-size R] [--app PATH]
+
+The database is created in a temporary directory, so the real
+attendance_tracker.db is never touched. Pass --app to measure another copy of
+app.py (e.g. an older revision) against the same workload.
+"""
+import argparse
+import gc
+import hashlib
+import os
+import sqlite3
+import sys
+import tempfile
+import tracemalloc
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+PASSWORD = "password"
+STATE_KEYS = ("logged_in", "username", "attendance_uploaded", "attendance_data", "roster_version", "roster_error")
+
+
+def rss_bytes():
+    # Current resident set size; only available where /proc exists
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def value_bytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return sys.getsizeof(value)
+
+
+def seed_database(faculty, roster_size):
+    # Rosters are stored the way the original app stored them, so every revision can load them
+    conn = sqlite3.connect('attendance_tracker.db')
+    c = conn.cursor()
+    c.execute("CREATE TABLE IF NOT EXISTS users (username TEXT PRIMARY KEY, password_hash TEXT)")
+    c.execute("CREATE TABLE IF NOT EXISTS student_data (username TEXT PRIMARY KEY, data TEXT)")
+    password_hash = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    for i in range(faculty):
+        username = f"faculty{i}"
+        roster = pd.DataFrame({
+            'roll': range(1, roster_size + 1),
+            'name': [f"Student {n} of {username}" for n in range(1, roster_size + 1)],
+        })
+        roster['batch'] = [("A", "B", "C", "D")[n % 4] for n in range(roster_size)]
+        c.execute("INSERT INTO users VALUES (?, ?)", (username, password_hash))
+        c.execute("INSERT INTO student_data VALUES (?, ?)", (username, roster.to_json()))
+    conn.commit()
+    conn.close()
+
+
+def login_session(app_path, username):
+    at = AppTest.from_file(app_path, default_timeout=120).run()
+    [t for t in at.text_input if t.key == "login_username"][0].input(username)
+    [t for t in at.text_input if t.key == "login_password"][0].input(PASSWORD)
+    [b for b in at.button if b.key == "login_btn"][0].click()
+    at.run()
+    if at.exception:
+        raise RuntimeError(f"Login for {username} failed: {at.exception[0].value}")
+    return at
+
+
+def session_state_bytes(at):
+    return sum(value_bytes(at.session_state[key]) for key in STATE_KEYS if key in at.session_state)
+
+
+def measure(app_path, sessions, faculty, roster_size):
+    seed_database(faculty, roster_size)
+
+    # Warm up once per faculty so one-off costs (imports, migration, shared cache) are excluded
+    warmup = [login_session(app_path, f"faculty{i}") for i in range(faculty)]
+    gc.collect()
+
+    tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0]
+    rss_before = rss_bytes()
+
+    active = [login_session(app_path, f"faculty{n % faculty}") for n in range(sessions)]
+    gc.collect()
+
+    heap_after = tracemalloc.get_traced_memory()[0]
+    rss_after = rss_bytes()
+    tracemalloc.stop()
+
+    state = [session_state_bytes(at) for at in active]
+    del warmup
+    return {
+        "heap_per_session": (heap_after - heap_before) / sessions,
+        "rss_per_session": (rss_after - rss_before) / sessions if rss_before is not None else None,
+        "state_per_session": sum(state) / len(state),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-session memory of the attendance app.")
+    parser.add_argument("--sessions", type=int, default=40, help="Concurrent logged-in sessions to simulate")
+    parser.add_argument("--faculty", type=int, default=5, help="Distinct faculty accounts the sessions log in as")
+    parser.add_argument("--roster-size", type=int, default=20000, help="Students per faculty roster")
+    parser.add_argument("--app", default=APP_PATH, help="Path to the app.py to measure")
+    args = parser.parse_args()
+
+    app_path = os.path.abspath(args.app)
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        result = measure(app_path, args.sessions, args.faculty, args.roster_size)
+
+    print(f"{args.sessions} sessions, {args.faculty} faculty, {args.roster_size} students per roster")
+    print(f"  session_state per session: {result['state_per_session'] / 1024:10.1f} KB")
+    print(f"  traced heap per session:   {result['heap_per_session'] / 1024:10.1f} KB")
+    if result["rss_per_session"] is not None:
+        print(f"  RSS per session:           {result['rss_per_session'] / 1024:10.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
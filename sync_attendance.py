@@ -0,0 +1,131 @@
+"""Incrementally sync the attendance change log to a local file.
+
+Every recorded session appends (date, type, batch, roll, status) rows to the
+attendance_changes table. This script writes only the rows added since the
+last sync of the same target, so downstream spreadsheets never have to
+re-download the full register.
+
+Usage:
+    python sync_attendance.py USERNAME TARGET [--format csv|jsonl|parquet]
+
+Rows are deltas. The first recording of a session emits every student in it;
+re-recording the same date and type emits only the rolls whose status
+changed. When a consumer sees the same (date, type, roll) more than once, the
+row with the highest seq is the current status.
+
+CSV and JSONL targets are appended to. Parquet files cannot be appended to,
+so a Parquet target is a directory that receives one part file per sync.
+"""
+import argparse
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+DB_PATH = 'attendance_tracker.db'
+FORMATS = ("csv", "jsonl", "parquet")
+
+
+def init_cursor_table(conn):
+    c = conn.cursor()
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS sync_cursors
+    (username TEXT, target TEXT, last_seq INTEGER, 
+    PRIMARY KEY (username, target))
+    ''')
+    conn.commit()
+
+
+def load_cursor(conn, username, target):
+    c = conn.cursor()
+    c.execute("SELECT last_seq FROM sync_cursors WHERE username=? AND target=?", (username, target))
+    result = c.fetchone()
+    return result[0] if result else 0
+
+
+def save_cursor(conn, username, target, last_seq):
+    c = conn.cursor()
+    c.execute("INSERT OR REPLACE INTO sync_cursors (username, target, last_seq) VALUES (?, ?, ?)", 
+              (username, target, last_seq))
+    conn.commit()
+
+
+def fetch_changes(conn, username, since):
+    return pd.read_sql_query(
+        "SELECT seq, date, type, batch, roll, status FROM attendance_changes "
+        "WHERE username=? AND seq>? ORDER BY seq",
+        conn, params=(username, since))
+
+
+def write_changes(df, target, fmt):
+    if fmt == "csv":
+        df.to_csv(target, mode="a", header=not os.path.exists(target), index=False)
+    elif fmt == "jsonl":
+        with open(target, "a") as f:
+            for record in df.to_dict(orient="records"):
+                f.write(json.dumps(record, default=str) + "\n")
+    elif fmt == "parquet":
+        # Rolls keep their Excel type in SQLite and may mix ints and strings,
+        # which Parquet columns cannot hold
+        df = df.astype({"roll": str})
+        os.makedirs(target, exist_ok=True)
+        part = f"changes_{df['seq'].iloc[0]:010d}_{df['seq'].iloc[-1]:010d}.parquet"
+        df.to_parquet(os.path.join(target, part), index=False)
+
+
+def detect_format(target):
+    ext = os.path.splitext(target)[1].lower().lstrip(".")
+    if ext in FORMATS:
+        return ext
+    if ext == "" and os.path.isdir(target):
+        return "parquet"
+    raise ValueError(f"Cannot infer format from '{target}'; pass --format")
+
+
+def has_change_log(conn):
+    c = conn.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='attendance_changes'")
+    return c.fetchone() is not None
+
+
+def sync(username, target, fmt=None, db_path=DB_PATH):
+    fmt = fmt or detect_format(target)
+    # Cursors are keyed by absolute path so the same file is never synced twice
+    target_key = os.path.abspath(target)
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        if not has_change_log(conn):
+            raise ValueError(f"No attendance change log in '{db_path}'; run the app and record a session first")
+        init_cursor_table(conn)
+        since = load_cursor(conn, username, target_key)
+        changes = fetch_changes(conn, username, since)
+        if changes.empty:
+            return 0
+        
+        write_changes(changes, target, fmt)
+        # Advance the cursor only after the write succeeded
+        save_cursor(conn, username, target_key, int(changes['seq'].iloc[-1]))
+        return len(changes)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync new attendance changes to a local file.")
+    parser.add_argument("username", help="Faculty account whose changes are synced")
+    parser.add_argument("target", help="Output file (.csv/.jsonl) or directory (Parquet)")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (inferred from TARGET if omitted)")
+    parser.add_argument("--db", default=DB_PATH, help="Path to the attendance database")
+    args = parser.parse_args()
+    
+    try:
+        count = sync(args.username, args.target, args.format, args.db)
+    except (ValueError, sqlite3.Error) as e:
+        parser.error(str(e))
+    print(f"Synced {count} change(s) to {args.target}")
+
+
+if __name__ == "__main__":
+    main()